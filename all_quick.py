@@ -1,35 +1,58 @@
+import argparse
+from concurrent.futures import ProcessPoolExecutor
 from main import *
 
-while (t:=int(time.time()%86400))//3600 < 16: # not 4PM GMT yet
-    print(t)
-    time.sleep(10)
-    logging.info(f'Waiting... Current time: {str(t//3600).zfill(2)}:{str(t//60%60).zfill(2)}:{str(t%60).zfill(2)} GMT')
+def warm_up(source):
+    '''
+    Runs once in every worker before the rollover: builds the geometry of every side, opens the HTTP connection
+    with the current puzzle and, if that one isn't served in plain HTML, launches the browser the worker will fall back to.
+    Never raises, since an exception here would break the whole executor.
+    '''
+    for side in range(1, 33):
+        get_geometry(side)
+    try:
+        fetch_page(f'{source}/?side=1&day=')
+    except Exception as e:
+        logging.info(f'{type(e).__name__}: {e}')
+        try:
+            pool = get_pool(get_supplier())
+            pool.give_back(pool.borrow())
+        except Exception as e:
+            logging.info(f'{type(e).__name__}: {e}')
 
-result = []
-for side in range(1, 33):
-    t_parse, t_algo, _, _, solved = main(day='', n=side, quick=1, spoiler=True)
-    result.append((t_parse, t_algo, solved))
+def solve_side(side, source=REGEXLE_URL, corpus=None):
+    '''
+    Runs in a worker process, which keeps its own HTTP session and browser pool across the sides it gets
+    '''
+    _, t_parse, t_algo, _, _, solved = main(day='', n=side, quick=1, spoiler=True, source=source, corpus=corpus)
+    return t_parse, t_algo, solved
 
-unsolved = [i+1 for i in range(len(result)) if not result[i][2]]
-max_parse = max((result[i][0], i+1) for i in range(len(result)))
-max_algo = max((result[i][1], i+1) for i in range(len(result)))
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog='all_quick', description='Solve every Regexle side in quick mode')
+    parser.add_argument('-w', '--workers', default=os.cpu_count(), help='Number of sides solved in parallel')
+    parser.add_argument('-u', '--url', default=REGEXLE_URL, help='Where to get the puzzles from (e.g. a local fixture_server.py)')
+    parser.add_argument('--corpus', default=None, help='Directory to save the parsed rulesets to, for bench.py')
+    args = parser.parse_args()
 
-message = f'''Unsolved Regexle(s): {unsolved}
+    # largest sides first so that the slowest ones don't end up at the tail of the queue
+    sides = list(range(32, 0, -1))
+    with ProcessPoolExecutor(max_workers=int(args.workers), initializer=warm_up, initargs=(args.url,)) as executor:
+        list(executor.map(get_geometry, sides)) # start (and warm up) the workers before the rollover, not after
+        # the workers do the solving, this process only watches for the new puzzle
+        wait_for_rollover(get_pool(get_supplier()), f'{args.url}/?side=1&day=', 1, warm_browser=False)
+        result = dict(zip(sides, executor.map(solve_side, sides, [args.url]*len(sides), [args.corpus]*len(sides))))
+    result = [result[side] for side in range(1, 33)]
+
+    unsolved = [i+1 for i in range(len(result)) if not result[i][2]]
+    max_parse = max((result[i][0], i+1) for i in range(len(result)))
+    max_algo = max((result[i][1], i+1) for i in range(len(result)))
+
+    message = f'''Unsolved Regexle(s): {unsolved}
 Maximum time to parse board:\t{max_parse[0]}s for side {max_parse[1]}
 Maximum time to backtrack:\t{max_algo[0]}s for side {max_algo[1]}'''
 
-print(message)
-
-for chat_id in CHATS.split(','):
-    send(TOKEN, chat_id, f'{message}\n\n#unregexle' \
-            .replace('.', '\\.') \
-            .replace('*', '\\*') \
-            .replace('#', '\\#') \
-            .replace('+', '\\+') \
-            .replace('-', '\\-') \
-            .replace('=', '\\=') \
-            .replace('(', '\\(') \
-            .replace(')', '\\)') \
-            .replace('[', '\\[') \
-            .replace(']', '\\]')
-        )
+    print(message)
+
+    from notify import escape, notify
+    token, chats = get_credentials()
+    notify(token, chats.split(','), escape(f'{message}\n\n#unregexle', markup=False))
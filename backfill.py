@@ -0,0 +1,104 @@
+import argparse
+import collections
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from main import *
+
+def parse_sides(text):
+    '''
+    E.g. '1-32' or '3,5,8-10'
+    '''
+    sides = []
+    for part in text.split(','):
+        lo, _, hi = part.partition('-')
+        sides.extend(range(int(lo), int(hi or lo)+1))
+    return sides
+
+def get_days(start, end):
+    start, end = date.fromisoformat(start), date.fromisoformat(get_puzzle_day(end))
+    return [(start+timedelta(days=k)).isoformat() for k in range((end-start).days+1)]
+
+def load_done(output):
+    '''
+    The (side, day) of every puzzle already in `output`, skipping the failed ones so that they are tried again
+    and a last line cut short by a crash
+    '''
+    done = set()
+    if not os.path.exists(output):
+        return done
+    with open(output) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if 'error' not in record:
+                done.add((record['side'], record['day']))
+    return done
+
+def fetch(pool, source, n, day):
+    t = time.time()
+    page_source = loop_resolve(get_page_source, lambda: None, ATTEMPT_LIMIT, pool, f'{source}/?side={n}&day={day}', n)
+    return page_source, round(time.time()-t, 5)
+
+def backfill(puzzles, output, inflight, time_limit, source=REGEXLE_URL, corpus=None):
+    '''
+    Fetch the `puzzles` with at most `inflight` pages being loaded at any time, solve them one by one as they come in
+    and append one JSON record per puzzle to `output` right away, so that a crashed run picks up where it stopped
+    '''
+    pool = get_pool(get_supplier(), inflight) # one warm browser per concurrent fetch that falls back to it
+    cut_short = False # last record of a crashed run only half written
+    if os.path.exists(output) and os.path.getsize(output):
+        with open(output, 'rb') as f:
+            f.seek(-1, os.SEEK_END)
+            cut_short = f.read() != b'\n'
+    with open(output, 'a') as f, ThreadPoolExecutor(max_workers=inflight) as executor:
+        if cut_short:
+            f.write('\n')
+        puzzles, pending = iter(puzzles), collections.deque()
+        for n, day in puzzles:
+            pending.append((n, day, executor.submit(fetch, pool, source, n, day)))
+            if len(pending) == inflight:
+                break
+        while pending:
+            n, day, future = pending.popleft()
+            for more in puzzles: # keep the window full while this one gets solved
+                pending.append((*more, executor.submit(fetch, pool, source, *more)))
+                break
+            record = {'side': n, 'day': day}
+            try:
+                page_source, record['t_load'] = future.result()
+                t = time.time()
+                rules = parse(page_source, n)
+                if corpus:
+                    save_rules(corpus, n, day, rules)
+                record['t_parse'] = round((t1:=time.time())-t, 5)
+                record['answer'], record['solved'] = solve(rules, n, time_limit)
+                record['t_algo'] = round(time.time()-t1, 5)
+            except Exception as e:
+                record['error'] = f'{type(e).__name__}: {e}'
+            f.write(json.dumps(record)+'\n')
+            f.flush()
+            logging.info(f"side={n} day={day}: {record.get('error') or ('solved' if record['solved'] else 'unsolved')}")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog='backfill', description='Solve a range of past Regexle puzzles in one process')
+    parser.add_argument('-n', '--sides', default='1-32', help='Sides to solve, e.g. 1-32 or 3,5,8-10')
+    parser.add_argument('--start', required=True, help='First day to solve (YYYY-MM-DD)')
+    parser.add_argument('--end', default='', help='Last day to solve (YYYY-MM-DD), today by default')
+    parser.add_argument('-o', '--output', default='backfill.jsonl', help='JSONL file to append the results to, and to resume from')
+    parser.add_argument('-f', '--inflight', default=4, help='Number of pages being fetched at the same time')
+    parser.add_argument('-t', '--time-limit', default=SEARCH_TIME_LIMIT, help='Time budget in seconds for the backtracking fallback')
+    parser.add_argument('-u', '--url', default=REGEXLE_URL, help='Where to get the puzzles from (e.g. a local fixture_server.py)')
+    parser.add_argument('--corpus', default=None, help='Directory to save the parsed rulesets to, for bench.py')
+    args = parser.parse_args()
+    sides = parse_sides(args.sides)
+    assert all(1 <= n <= 32 for n in sides), 'Size must be between 1 and 32 inclusively'
+
+    done = load_done(args.output)
+    puzzles = [(n, day) for day in get_days(args.start, args.end) for n in sides if (n, day) not in done]
+    logging.info(f'{len(done)} puzzle(s) already done, {len(puzzles)} to go')
+    backfill(puzzles, args.output, int(args.inflight), float(args.time_limit), args.url, args.corpus)
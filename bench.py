@@ -0,0 +1,84 @@
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from solver import load_rules, solve, SEARCH_TIME_LIMIT
+
+CORPUS = 'corpus'
+
+# a side only counts as slower than the baseline if it is this much slower, relatively and absolutely,
+# so that timer noise on the small sides doesn't fail the comparison
+TOLERANCE = 0.25
+NOISE_FLOOR = 0.005
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values)-1, int(q*len(values)))]
+
+def bench(corpus, repeat, time_limit):
+    '''
+    Solve every puzzle of the corpus `repeat` times and summarize the solve rate and latency per side
+    '''
+    runs = {}
+    for path in sorted(glob.glob(os.path.join(corpus, '*.json'))):
+        with open(path) as f:
+            puzzle = json.load(f)
+        n, rules = puzzle['side'], load_rules(puzzle['rules'])
+        for _ in range(repeat):
+            t = time.perf_counter()
+            _, solved = solve(rules, n, time_limit)
+            runs.setdefault(n, []).append((time.perf_counter()-t, solved))
+
+    report = {}
+    for n, results in sorted(runs.items()):
+        times = [t for t, _ in results]
+        report[n] = {
+            'runs': len(results),
+            'solve_rate': sum(solved for _, solved in results)/len(results),
+            'p50': percentile(times, 0.5),
+            'p95': percentile(times, 0.95),
+            'max': max(times)
+        }
+    return report
+
+def compare(report, baseline):
+    '''
+    List what got worse than `baseline`, i.e. a lower solve rate or a slower p95 on any side
+    '''
+    regressions = []
+    for n, stats in report.items():
+        if (old := baseline.get(n)) == None:
+            continue
+        if stats['solve_rate'] < old['solve_rate']:
+            regressions.append(f"side {n}: solve rate {old['solve_rate']:.0%} -> {stats['solve_rate']:.0%}")
+        if stats['p95'] > old['p95']*(1+TOLERANCE) + NOISE_FLOOR:
+            regressions.append(f"side {n}: p95 {old['p95']*1000:.1f}ms -> {stats['p95']*1000:.1f}ms")
+    return regressions
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog='bench', description='Benchmark the solver over a corpus of saved rulesets')
+    parser.add_argument('-c', '--corpus', default=CORPUS, help='Directory of rulesets saved with --corpus')
+    parser.add_argument('-r', '--repeat', default=3, help='Number of times each puzzle is solved')
+    parser.add_argument('-t', '--time-limit', default=SEARCH_TIME_LIMIT, help='Time budget in seconds for the backtracking fallback')
+    parser.add_argument('-b', '--baseline', default=None, help='Compare against this baseline and fail on regressions')
+    parser.add_argument('-s', '--save', default=None, help='Save the results as a baseline to this file')
+    args = parser.parse_args()
+
+    report = bench(args.corpus, int(args.repeat), float(args.time_limit))
+    assert report, f'No rulesets found in {args.corpus}'
+    print(f"{'side':>4} {'runs':>5} {'solved':>7} {'p50 (ms)':>9} {'p95 (ms)':>9} {'max (ms)':>9}")
+    for n, stats in report.items():
+        print(f"{n:>4} {stats['runs']:>5} {stats['solve_rate']:>7.0%} {stats['p50']*1000:>9.1f} {stats['p95']*1000:>9.1f} {stats['max']*1000:>9.1f}")
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(report, f, indent=4)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = {int(n): stats for n, stats in json.load(f).items()}
+        regressions = compare(report, baseline)
+        for regression in regressions:
+            print(f'Regression on {regression}')
+        sys.exit(1 if regressions else 0)
@@ -0,0 +1,59 @@
+import argparse
+import os
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+def fixture_path(side, day=''):
+    return os.path.join(FIXTURES, f'side{side}_day{day}.html' if day else f'side{side}.html')
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    '''
+    Serves saved Regexle pages the same way regexle.com does, i.e. GET /?side=<n>&day=<day>
+    A page saved for a specific day wins over the generic one of the same side.
+    '''
+    def do_GET(self):
+        query = parse_qs(urlparse(self.path).query)
+        side, day = query.get('side', ['3'])[0], query.get('day', [''])[0]
+        for path in (fixture_path(side, day), fixture_path(side)):
+            if os.path.exists(path):
+                with open(path, 'rb') as f:
+                    body = f.read()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/html; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+                return
+        self.send_error(404, f'No fixture saved for side={side} day={day}')
+
+def capture(n, day):
+    '''
+    Save the rendered page of a live puzzle as a fixture, this is the only part that needs a browser
+    '''
+    from main import get_supplier, wait_until_ready, REGEXLE_URL
+    browser = get_supplier()()
+    try:
+        browser.get(f'{REGEXLE_URL}/?side={n}&day={day}')
+        wait_until_ready(browser, n)
+        os.makedirs(FIXTURES, exist_ok=True)
+        with open(fixture_path(n, day), 'w', encoding='utf-8') as f:
+            f.write(browser.page_source)
+    finally:
+        browser.quit()
+    print(f'Saved {fixture_path(n, day)}', flush=True)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog='fixture_server', description='Serve saved Regexle pages locally')
+    parser.add_argument('-p', '--port', default=8000, help='Port to listen on')
+    parser.add_argument('-n', '--side', default=None, help='Capture the live page of this side instead of serving')
+    parser.add_argument('-d', '--day', default='', help='Day of the puzzle to capture')
+    args = parser.parse_args()
+
+    if args.side:
+        capture(int(args.side), args.day)
+    else:
+        server = ThreadingHTTPServer(('127.0.0.1', int(args.port)), FixtureHandler)
+        print(f'Serving {FIXTURES} on http://127.0.0.1:{args.port}', flush=True)
+        server.serve_forever()
@@ -0,0 +1,67 @@
+import argparse
+import json
+import os
+import random
+import string
+from bench import CORPUS
+from solver import get_geometry
+
+def random_rule(line, rnd):
+    '''
+    A rule that `line` matches, in either of the two shapes `parse` understands.
+    Mode 0 keeps most of the line as ordered blocks with a few gaps: .*r1.*r2.*
+    Mode 1 cuts the line into blocks, some with an extra optional character or a choice, plus a few decoys: (r1|r2|...)+
+    '''
+    if rnd.random() < 0.5:
+        blocks, idx = [], rnd.randint(0, min(1, len(line)-1)) # a gap in front, as long as a block is left after it
+        while idx < len(line):
+            end = rnd.randint(idx+1, min(len(line), idx+4))
+            blocks.append(line[idx:end])
+            idx = end + rnd.randint(0, 1)
+        return '.*' + '.*'.join(blocks) + '.*'
+
+    blocks, idx = [], 0
+    while idx < len(line):
+        end = min(len(line), idx+rnd.randint(1, 3))
+        blocks.append(line[idx:end])
+        idx = end
+    result = []
+    for blk in dict.fromkeys(blocks):
+        r = rnd.random()
+        if r < 0.15:
+            blk += rnd.choice(string.ascii_uppercase) + '?'
+        elif r < 0.3:
+            i = rnd.randrange(len(blk))
+            blk = blk[:i] + '[' + ''.join(sorted({blk[i], rnd.choice(string.ascii_uppercase)})) + ']' + blk[i+1:]
+        result.append(blk)
+    for _ in range(rnd.randint(0, 2)):
+        result.append(''.join(rnd.choices(string.ascii_uppercase, k=rnd.randint(1, 3))))
+    rnd.shuffle(result)
+    return '(' + '|'.join(result) + ')+'
+
+def generate(n, seed):
+    '''
+    Fill a board of side `n` with random letters and derive a rule for every line from it.
+    Returns the filled board (one possible answer) and the rule texts of each axis.
+    '''
+    rnd = random.Random(f'{n}-{seed}')
+    rows, lines, _ = get_geometry(n)
+    answer = ''.join(rnd.choices(string.ascii_uppercase, k=rows[-1][1]))
+    texts = {ax: [random_rule(''.join(answer[c] for c in line), rnd) for line in lines[ax]] for ax in 'xyz'}
+    return answer, texts
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog='generate', description='Generate synthetic Regexle boards of any size')
+    parser.add_argument('-n', '--side', default=3, help='Size of the boards')
+    parser.add_argument('-k', '--count', default=1, help='Number of boards')
+    parser.add_argument('-c', '--corpus', default=CORPUS, help='Directory to save the boards to, for bench.py')
+    args = parser.parse_args()
+
+    n = int(args.side)
+    os.makedirs(args.corpus, exist_ok=True)
+    for seed in range(int(args.count)):
+        answer, texts = generate(n, seed)
+        path = os.path.join(args.corpus, f'side{n}_daysynthetic{seed}.json')
+        with open(path, 'w') as f:
+            json.dump({'side': n, 'day': f'synthetic{seed}', 'rules': texts, 'answer': answer}, f)
+        print(f'Saved {path}', flush=True)
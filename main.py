@@ -1,24 +1,21 @@
 import argparse
-import itertools
+import atexit
+import functools
+import hashlib
+import json
 import logging
 import os
 import platform
-import re
-import requests
-import string
-import sys
+import queue
+import sqlite3
 import time
-from bs4 import BeautifulSoup
-from selenium import webdriver
-from selenium.webdriver import Keys, ActionChains
-from selenium.webdriver.common.by import By
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.chrome.service import Service
-from webdriver_manager.chrome import ChromeDriverManager
+from datetime import datetime, timedelta, timezone
+from html.parser import HTMLParser
+from solver import load_rules, get_geometry, solve, format_answer, SEARCH_TIME_LIMIT
 
+# selenium, webdriver_manager, bs4, requests and the Telegram client are only imported where they are used,
+# so that importing this module for its helpers stays cheap
 os.environ['WDM_LOG'] = '0'
-try:    TOKEN, CHATS = os.environ['TOKEN'], os.environ['CHATS']
-except: from env import TOKEN, CHATS
 
 logging.basicConfig(
     level=logging.INFO, 
@@ -27,8 +24,18 @@ logging.basicConfig(
 )
 
 # Constants
-sys.setrecursionlimit(5000)
 ATTEMPT_LIMIT = 2
+REGEXLE_URL = 'https://regexle.com'
+REGEXLE_TZ = timezone(timedelta(hours=8))
+CACHE_PATH = 'cache.sqlite3'
+CACHE_MAX_AGE = 7*86400
+HTTP_TIMEOUT = 10
+PAGE_TIMEOUT = 20
+POLL_INTERVAL = 0.05
+INJECT_TIMEOUT = 2
+ROLLOVER = 16*3600 # seconds into the GMT day when a new puzzle comes out, i.e. midnight Singapore time
+ROLLOVER_POLL = 0.2
+ROLLOVER_TIMEOUT = 300
 
 def loop_resolve(f, resolution, lim, *args):
     if lim == 0:
@@ -41,17 +48,24 @@ def loop_resolve(f, resolution, lim, *args):
         return loop_resolve(f, resolution, lim-1, *args)
 
 def get_windows_browser():
+    from selenium import webdriver
+    from selenium.webdriver.chrome.service import Service
     service = Service()
     options = webdriver.ChromeOptions()
     options.add_argument('--headless')
+    options.page_load_strategy = 'eager' # readiness is checked on the board itself, see wait_until_ready
     options.add_experimental_option('excludeSwitches', ['enable-logging'])
     browser = webdriver.Chrome(service=service, options=options)
     return browser
 
 def get_linux_browser():
+    from selenium import webdriver
+    from selenium.webdriver.chrome.options import Options
+    from selenium.webdriver.chrome.service import Service
     service = Service()
     chrome_options = Options()
     chrome_options.binary_location = "/usr/bin/chromium"
+    chrome_options.page_load_strategy = 'eager' # readiness is checked on the board itself, see wait_until_ready
     options = [
         "--headless=new",
         "--disable-gpu",
@@ -66,14 +80,92 @@ def get_linux_browser():
     browser.execute_cdp_cmd('Emulation.setTimezoneOverride', {'timezoneId': 'Singapore'})
     return browser
 
-def send(token, chat_id, bot_message):
-    resp = requests.get(f'https://api.telegram.org/bot{token}/sendMessage', params={
-        'chat_id': chat_id,
-        'parse_mode': 'MarkdownV2',
-        'text': bot_message,
-        'disable_web_page_preview': False
-        })
-    logging.info(f"{resp.status_code} - {resp.json().get('description')}" if not resp.ok else f"{resp.status_code} - {resp.ok}")
+@functools.lru_cache(maxsize=None)
+def get_cache(path):
+    '''
+    One connection per process to the solution cache at `path`, entries older than CACHE_MAX_AGE are evicted on open
+    '''
+    db = sqlite3.connect(path, timeout=30)
+    db.execute('''CREATE TABLE IF NOT EXISTS solutions (
+        side INTEGER, day TEXT, rules_hash TEXT, answer TEXT, t_algo REAL, created REAL,
+        PRIMARY KEY (side, day, rules_hash))''')
+    db.execute('DELETE FROM solutions WHERE created < ?', (time.time()-CACHE_MAX_AGE,))
+    db.commit()
+    return db
+
+def hash_rules(rules):
+    return hashlib.sha256(json.dumps({ax: [rule[2] for rule in rules[ax]] for ax in 'xyz'}).encode()).hexdigest()
+
+def get_cached_answer(path, n, day, rules):
+    '''
+    The (answer, time it took to solve) of a puzzle solved before, or None
+    '''
+    return get_cache(path).execute('SELECT answer, t_algo FROM solutions WHERE side = ? AND day = ? AND rules_hash = ?',
+        (n, get_puzzle_day(day), hash_rules(rules))).fetchone()
+
+def put_cached_answer(path, n, day, rules, answer, t_algo):
+    db = get_cache(path)
+    db.execute('INSERT OR REPLACE INTO solutions VALUES (?, ?, ?, ?, ?, ?)',
+        (n, get_puzzle_day(day), hash_rules(rules), answer, t_algo, time.time()))
+    db.commit()
+
+@functools.lru_cache(maxsize=None)
+def get_session():
+    '''
+    One shared HTTP session per process, so that consecutive fetches reuse pooled connections
+    '''
+    import requests
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=2)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+def fetch_page(link):
+    '''
+    Get the puzzle page over plain HTTP, no browser involved.
+    Raises if the rules are not in the served HTML, e.g. when the page only renders them with JavaScript.
+    '''
+    resp = get_session().get(link, timeout=HTTP_TIMEOUT)
+    resp.raise_for_status()
+    assert 'rule_x_0' in resp.text, 'Rules are not served in the HTML page'
+    return resp.text
+
+class RuleExtractor(HTMLParser):
+    '''
+    Collects the text of every rule_* div sitting in a hexagon_center div, in a single pass over the page
+    '''
+    def __init__(self):
+        super().__init__()
+        self.texts = {}
+        self.divs = []      # (is a hexagon_center, rule id or None) for every div still open
+        self.centers = 0    # number of hexagon_center divs still open
+        self.current = None # (rule id, text parts) of the rule being read
+
+    def handle_starttag(self, tag, attrs):
+        if tag != 'div':
+            return
+        attrs = dict(attrs)
+        is_center = 'hexagon_center' in (attrs.get('class') or '').split()
+        rule = attrs.get('id') or ''
+        rule = rule if self.centers and self.current == None and rule.startswith('rule_') else None
+        if rule:
+            self.current = (rule, [])
+        self.divs.append((is_center, rule))
+        self.centers += is_center
+
+    def handle_endtag(self, tag):
+        if tag != 'div' or not self.divs:
+            return
+        is_center, rule = self.divs.pop()
+        self.centers -= is_center
+        if rule:
+            self.texts[rule] = ''.join(self.current[1])
+            self.current = None
+
+    def handle_data(self, data):
+        if self.current:
+            self.current[1].append(data)
 
 def parse(html, n):
     '''
@@ -83,375 +175,192 @@ def parse(html, n):
 
     Note that for mode 1 we can have question marks for optional character and square brackets for choices.
     E.g. (AB?C|DE)+ means (ABC|AC|DE)+, (A[BC]D|EF)+ means (ABD|ACD|EF)+
+    These blocks are kept in a trie rather than expanded, see `handle_qn_and_sq`.
 
     For each three axes x, y, and z, there are 2n-1 rules, we will parse these accordingly too.
+    `html` is the raw page source, all the rules are picked up in a single pass by `RuleExtractor`.
+    Every rule is also compiled once into an automaton for the solver (see `compile_rule`)
+    and into a regex pattern for the validation.
     '''
-    def handle_qn_and_sq(s):
-        pre_result = []
-        for v in s:
-            tmp = ['']
-            for i in range(len(v)):
-                if v[i] == '?': continue
-                if i < len(v)-1 and v[i+1] == '?':
-                    tmp = tmp + [x+v[i] for x in tmp]
-                else:
-                    tmp = [x+v[i] for x in tmp]
-            pre_result.extend(tmp)
-        result = []
-        for blk in pre_result:
-            idx = 0
-            tmp = ['']
-            while idx < len(blk):
-                if blk[idx] == '[':
-                    idx += 1
-                    new_tmp = []
-                    while blk[idx] != ']':
-                        new_tmp.extend(x+blk[idx] for x in tmp)
-                        idx += 1
-                    tmp = new_tmp
-                else:
-                    tmp = [x+blk[idx] for x in tmp]
-                idx += 1
-            result.extend(tmp)
-        return result
-
-    rules = {ax:{} for ax in 'xyz'}
-    for hexagon in html.findAll('div', class_='hexagon_center'):
-        for ax in 'xyz':
-            for k in range(2*n-1):
-                for rule in hexagon.findAll('div', id=f'rule_{ax}_{k}'):
-                    text = rule.text.strip()
-                    if text[0] == '.':
-                        rules[ax][k] = (0, [s for s in text.split('.*') if s], text)        # .*r1.*r2.*
-                    else:
-                        rules[ax][k] = (1, handle_qn_and_sq(text[1:-2].split('|')), text)   # (r1|r2|...)+
-    for ax in rules:
-        rules[ax] = [rules[ax][k] for k in range(2*n-1)]
-    return rules
-
-def solve(rules, n):
-    hexagons = [[{} for _ in range(2*n-1-abs(n-1-i))] for i in range(2*n-1)]
-    rule2hexagon = {}
-
-    # two-way map hexagon coordinates to x-axis rules
-    for i in range(2*n-1):
-        r = range(max(i-n+1, 0), min(2*n-1, n+i))
-        idx = len(r)-1
-        for j in r:
-            hexagons[j][i-max(j-n+1, 0)]['x'] = (i, idx)
-            rule2hexagon[('x', i, idx)] = (j, i-max(j-n+1, 0))
-            idx -= 1
-
-    # two-way map hexagon coordinates to y-axis rules
-    for i in range(2*n-1):
-        for j in range(2*n-1-abs(n-1-i)):
-            hexagons[i][j]['y'] = (i, j)
-            rule2hexagon[('y', i, j)] = (i, j)
-
-    # two-way map hexagon coordinates to z-axis rules
-    for i in range(2*n-1):
-        r = range(max(i-n+1, 0), min(2*n-1, n+i))
-        idx = len(r)-1
-        for j in r:
-            hexagons[-j-1][i-max(j-n+1, 0)]['z'] = (i, idx)
-            rule2hexagon[('z', i, idx)] = ((-j-1)%(2*n-1), i-max(j-n+1, 0))
-            idx -= 1
-
-    def handle_outer():
-        pos = [(i, j) for i in range(2*n-1) for j in range(len(hexagons[i])) if i in (0, 2*n-2) or j in (0, len(hexagons[i])-1)]
-        for i, j in pos:
-            checks = []
-            for ax in 'xyz':
-                k, pos = hexagons[i][j][ax]
-                rule = rules[ax][k]
-                if rule[0] == 1 and ((ax, k, pos-1) not in rule2hexagon or (ax, k, pos+1) not in rule2hexagon):
-                    # add either first character or last character for each block
-                    checks.append(set(blk[-(pos!=0)] for blk in rule[1]))
-            if not checks:
-                continue
-            candidates = checks[0]
-            for k in range(1, len(checks)):
-                candidates &= checks[k]
-            if len(candidates) == 1:
-                v = candidates.pop()
-                for ax in 'xyz':
-                    k, pos = hexagons[i][j][ax]
-                    rule = rules[ax][k]
-                    if rule[0] == 1 and ((ax, k, pos-1) not in rule2hexagon or (ax, k, pos+1) not in rule2hexagon):
-                        valid_blocks = list(filter(lambda blk: blk[-(pos!=0)] == v, rule[1]))
-                        if len(valid_blocks) == 1:
-                            # we can fill the other dots with the entire block
-                            idx = pos
-                            blk = valid_blocks[0]
-                            blk_idx = -(pos!=0)
-                            delta = 2*(pos==0)-1
-                            for _ in range(len(blk)):
-                                ni, nj = rule2hexagon[(ax, k, idx)]
-                                hexagons[ni][nj]['v'] = blk[blk_idx]
-                                idx += delta
-                                blk_idx += delta
-
-    def derive_mode_0(tmp, blocks):
-        '''
-        Example 1:
-            tmp = ['.', 'A', 'B', 'C', '.', '.']
-            blocks = ['BC', 'EF']
-
-            You should be able to fill EF after the BC since that's the only valid way
-            ['.', 'A', 'B', 'C', 'E', 'F']
-
-        Example 2:
-            tmp = ['.', '.', '.', 'A']
-            blocks = ['B', 'F']
-
-            There are still too many valid outcomes from this, so nothing happens
-        '''
-        if not blocks:
-            return
-        sols = [set() for _ in range(len(tmp))]
-        def backtrack(block_idx, tmp_idx):
-            if block_idx == len(blocks):
-                for i in range(len(tmp)):
-                    sols[i].add(tmp[i])
-                return
-            if tmp_idx >= len(tmp) or tmp_idx+len(blocks[block_idx]) > len(tmp):
-                return
-            can_put = True
-            for i in range(len(blocks[block_idx])):
-                if blocks[block_idx][i] != tmp[tmp_idx+i] and tmp[tmp_idx+i] != '.':
-                    can_put = False
-                    break
-            if can_put:
-                original = []
-                for i in range(len(blocks[block_idx])):
-                    original.append(tmp[tmp_idx+i])
-                    tmp[tmp_idx+i] = blocks[block_idx][i]
-                backtrack(block_idx+1, tmp_idx+len(original))
-                for i in range(len(original)):
-                    tmp[tmp_idx+i] = original[i]
-            backtrack(block_idx, tmp_idx+1)
-        result = list(tmp)
-        backtrack(0, 0)
-        for i in range(len(tmp)):
-            if len(sols[i]) == 1: result[i] = sols[i].pop()
-        return result
-
-    def derive_mode_1(tmp, blocks):
-        '''
-        Example 1:
-            tmp = ['.', 'A', 'B', 'C', '.', '.']
-            blocks = ['ABC', 'E', 'FG']
-
-            You should be able to fill the remaining dots since there's only one way to do so
-            ['E', 'A', 'B', 'C', 'F', 'G']
-
-        Example 2:
-            tmp = ['.', '.', '.', 'A']
-            blocks = ['B', 'F']
-
-            There are still too many valid outcomes from this, so nothing happens
-        
-        Example 3:
-            tmp = ['.', 'A', 'B', 'C', '.', '.']
-            blocks = ['ABC', 'E', 'FG', 'HI']
-
-            Similar to Example 1 but the 'E' is the only obvious one
-            ['E', 'A', 'B', 'C', '.', '.']
-        '''
-        sols = [set() for _ in range(len(tmp))]
-        seen = {}
-        def backtrack(tmp_idx, blk):
-            if tmp_idx == len(tmp):
-                return True
-            if tmp_idx+len(blk) > len(tmp):
-                return False
-            if (tmp_idx, blk) in seen:
-                return seen[(tmp_idx, blk)]
-            for i in range(len(blk)):
-                if blk[i] != tmp[tmp_idx+i] and tmp[tmp_idx+i] != '.':
-                    seen[(tmp_idx, blk)] = False
-                    return False
-            original = []
-            for i in range(len(blk)):
-                original.append(tmp[tmp_idx+i])
-                tmp[tmp_idx+i] = blk[i]
-            seen[(tmp_idx, blk)] = False
-            for nxt_blk in blocks:
-                x = backtrack(tmp_idx+len(blk), nxt_blk)
-                if x:
-                    seen[(tmp_idx, blk)] = True
-                    for i in range(len(blk)):
-                        sols[tmp_idx+i].add(blk[i])
-            for i in range(len(blk)):
-                tmp[tmp_idx+i] = original[i]
-            return seen[(tmp_idx, blk)]
-        for blk in blocks:
-            backtrack(0, blk)
-        for i in range(len(tmp)):
-            if len(sols[i]) == 1:
-                tmp[i] = sols[i].pop()
-        return tmp
-
-    def get_current_exp(ax, k, include_pos=False):
-        '''
-        Helper function to get the state of row `k` in the given axis `ax`
-        '''
-        idx, tmp, pos = 0, [], []
-        while (rule_pos:=(ax, k, idx)) in rule2hexagon:
-            i, j = rule2hexagon[rule_pos]
-            tmp.append(hexagons[i][j].get('v', '.'))
-            pos.append((i, j))
-            idx += 1
-        if include_pos:
-            return tmp, pos
+    texts = get_rule_texts(html)
+    return load_rules({ax: [texts[f'rule_{ax}_{k}'] for k in range(2*n-1)] for ax in 'xyz'})
+
+def get_rule_texts(html):
+    extractor = RuleExtractor()
+    extractor.feed(html)
+    extractor.close()
+    return extractor.texts
+
+def get_puzzle_day(day):
+    '''
+    The given day, or today's date on the site (puzzles roll over at midnight Singapore time)
+    '''
+    return day or datetime.now(REGEXLE_TZ).strftime('%Y-%m-%d')
+
+def save_rules(corpus, n, day, rules):
+    '''
+    Save the rule texts of a parsed puzzle to the `corpus` directory, see bench.py
+    '''
+    os.makedirs(corpus, exist_ok=True)
+    path = os.path.join(corpus, f'side{n}_day{get_puzzle_day(day)}.json')
+    with open(path, 'w') as f:
+        json.dump({'side': n, 'day': get_puzzle_day(day), 'rules': {ax: [rule[2] for rule in rules[ax]] for ax in 'xyz'}}, f)
+    logging.info(f'Ruleset saved to {path}')
+
+class BrowserPool:
+    '''
+    Keeps warm browser sessions around so that consecutive solves (other sides, retries)
+    navigate a live driver instead of paying for a cold Chromium start every time.
+    '''
+    def __init__(self, supplier, size=1):
+        self.supplier = supplier
+        self.size = size
+        self.idle = queue.LifoQueue()
+
+    def launch(self):
+        logging.info('Starting a new browser...')
+        browser = self.supplier()
+        browser.maximize_window()
+        browser.set_page_load_timeout(PAGE_TIMEOUT)
+        return browser
+
+    def borrow(self):
+        while True:
+            try:
+                browser = self.idle.get_nowait()
+            except queue.Empty:
+                return self.launch()
+            try:
+                browser.current_url # cheap round trip to the driver
+                return browser
+            except Exception as e:
+                logging.info(f'Recycling unhealthy browser: {type(e).__name__}')
+                self.quit(browser)
+
+    def give_back(self, browser, healthy=True):
+        if healthy and self.idle.qsize() < self.size:
+            self.idle.put(browser)
         else:
-            return tmp
+            self.quit(browser)
 
-    def derive_middle():
-        for ax in 'xyz':
-            for k in range(2*n-1):
-                tmp = get_current_exp(ax, k)
-                sol = [derive_mode_0, derive_mode_1][rules[ax][k][0]](tmp, rules[ax][k][1])
-                if sol != None:
-                    for m in range(len(sol)):
-                        if sol[m] != '.':
-                            i, j = rule2hexagon[(ax, k, m)]
-                            hexagons[i][j]['v'] = sol[m]
-
-    def cancel_noise():
-        '''
-        If there is only one spot left, doesn't hurt to try all 26 uppercase letters!
-        This should resolve the issues found on smaller boards with non-unique solutions (e.g. n=2 or n=3)
-        '''
-        for i in range(2*n-1):
-            for j in range(len(hexagons[i])):
-                h = hexagons[i][j]
-                if 'v' not in h:
-                    dots, checks = [], set()
-                    for ax in 'xyz':
-                        k, _ = h[ax]
-                        tmp, pos = get_current_exp(ax, k, include_pos=True)
-                        dots.append([pos[x] for x in range(len(tmp)) if tmp[x] == '.'])
-                        checks |= {(ax2, hexagons[i2][j2][ax2][0]) for i2, j2 in dots[-1] for ax2 in 'xyz'}
-                    flatten_dots = set()
-                    for dot in dots:
-                        flatten_dots |= set(dot)
-                    flatten_dots = list(flatten_dots)
-                    if len(flatten_dots) < 4:
-                        for u in itertools.product(string.ascii_uppercase, repeat=len(flatten_dots)):
-                            for x in range(len(u)):
-                                i2, j2 = flatten_dots[x]
-                                hexagons[i2][j2]['v'] = u[x]
-                            if validate(checks, verbose=False):
-                                break
-                            for x in range(len(u)):
-                                i2, j2 = flatten_dots[x]
-                                if 'v' in hexagons[i2][j2]: del hexagons[i2][j2]['v']
-
-    def validate(checks=[(ax, k) for ax in 'xyz' for k in range(2*n-1)], verbose=True):
-        '''
-        Validate current answer with the regex rules
-        '''
-        ok = True
-        for ax, k in checks:
-            tmp = ''.join(get_current_exp(ax, k))
-            rule = '^' + rules[ax][k][2] + '$'
-            if not re.match(rule, tmp):
-                ok = False
-                if verbose:
-                    print(ax, k, rule, tmp, flush=True)
-        return ok
-
-    def display():
-        '''
-        Helper function to display the current answer based on the state of `hexagons`
-        '''
-        ans = []
-        for i in range(2*n-1):
-            for h in hexagons[i]: ans.append(h.get('v', '.'))
-        return ''.join(ans)
-
-    def debug_hexagon():
-        print(format_answer(display(), n), flush=True)
-        print(flush=True)
+    def quit(self, browser):
+        try:
+            browser.quit()
+        except Exception as e:
+            logging.info(f'{type(e).__name__}: {e}')
+
+    def close(self):
+        while not self.idle.empty():
+            self.quit(self.idle.get_nowait())
+
+@functools.lru_cache(maxsize=None)
+def get_pool(supplier, size=1):
+    pool = BrowserPool(supplier, size)
+    atexit.register(pool.close)
+    return pool
 
-    # The strategy is to start from the outer hexagons first because it's easier to derive,
-    # then continue to derive the remaining hexagons when possible.
-    # Repeat for sufficiently many times to handle propagated information
-    # and then we should be good!
-    for i in range(2*n):
-        handle_outer()
-        derive_middle()
-        if i%2: cancel_noise()
-        #debug_hexagon()
-    return display(), validate()
-
-def format_answer(answer, n, space=True, spoiler=False):
-    idx = 0
-    rows = []
-    for i in range(2*n-1):
-        tmp = ['||'] if spoiler else [' '*abs(n-1-i)]
-        for j in range(2*n-1-abs(n-1-i)):
-            tmp.append((answer[idx] if idx < len(answer) else '.')+' '*space)
-            idx += 1
-        if spoiler:
-            tmp.append('||')
-        rows.append(''.join(tmp))
-    return '\n'.join(rows)
-
-def run(n, day, spoiler, quick, supplier):
-    # start browser
-    browser = supplier()
-    browser.maximize_window()
-    browser.set_page_load_timeout(20)
+def wait_until_ready(browser, n):
+    '''
+    Wait until all 3(2n-1) rules are in the DOM, then close the info popup
+    and wait until the popup toggles look the same on two polls in a row
+    '''
+    from selenium.common.exceptions import StaleElementReferenceException
+    from selenium.webdriver import ActionChains
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support.ui import WebDriverWait
+    wait = WebDriverWait(browser, PAGE_TIMEOUT, poll_frequency=POLL_INTERVAL, ignored_exceptions=[StaleElementReferenceException])
+    wait.until(lambda d: len(d.find_elements(By.CSS_SELECTOR, 'div[id^="rule_"]')) >= 3*(2*n-1))
+
+    logging.info('Closing info popup...')
+    for popup in browser.find_elements(By.ID, 'info_toggle_image'):
+        if popup.is_displayed():
+            ActionChains(browser).click(popup).perform()
+    previous = []
+    def settled(d):
+        previous.append(tuple(popup.is_displayed() for popup in d.find_elements(By.ID, 'info_toggle_image')))
+        return len(previous) > 1 and previous[-1] == previous[-2]
+    wait.until(settled)
+
+def load_page(pool, link, n):
+    '''
+    Borrow a browser from `pool` and open `link` with it, retrying on a fresh browser at most ATTEMPT_LIMIT times
+    '''
+    for _ in range(ATTEMPT_LIMIT):
+        browser = pool.borrow()
+        try:
+            logging.info('Getting HTML source page...')
+            logging.info(link)
+            browser.get(link)
+            wait_until_ready(browser, n)
+            return browser
+        except Exception as e:
+            logging.info(f'{type(e).__name__}: {e}')
+            pool.give_back(browser, healthy=False)
+    raise Exception(f'Could not load {link}')
+
+def get_page_source(pool, link, n):
+    '''
+    The page source of `link` when nothing gets typed back: over plain HTTP if possible,
+    else with a browser borrowed from `pool` and given back right away
+    '''
     try:
-        logging.info('Getting HTML source page...')
-        link = f'https://regexle.com/?side={n}&day={day}'
+        logging.info('Getting HTML source page over HTTP...')
         logging.info(link)
-        browser.get(link)
-        time.sleep(0.7)
-        logging.info('Closing info popup...')
-        popups = browser.find_elements(By.ID, 'info_toggle_image')
-        for popup in popups:
-            if popup.is_displayed():
-                ActionChains(browser).click(popup).perform()
-                time.sleep(0.3)
+        return fetch_page(link)
     except Exception as e:
         logging.info(f'{type(e).__name__}: {e}')
-        browser.quit()
-        return run(n, day, spoiler, quick, supplier)
+        logging.info('Falling back to the browser...')
+    browser = load_page(pool, link, n)
+    page_source = browser.page_source
+    pool.give_back(browser)
+    return page_source
+
+# Fills every board_entry at once, firing the same events as typing so that the page runs its own checks
+INJECT_SCRIPT = '''
+const answer = arguments[0];
+const entries = document.getElementsByClassName('board_entry');
+if (entries.length !== answer.length) return false;
+const setValue = Object.getOwnPropertyDescriptor(HTMLInputElement.prototype, 'value').set;
+for (let i = 0; i < entries.length; i++) {
+    const entry = entries[i], key = answer[i] === '.' ? '' : answer[i];
+    entry.focus();
+    if (entry instanceof HTMLInputElement) setValue.call(entry, key); else entry.textContent = key;
+    for (const type of ['keydown', 'keypress']) entry.dispatchEvent(new KeyboardEvent(type, {key: key, bubbles: true}));
+    entry.dispatchEvent(new Event('input', {bubbles: true}));
+    entry.dispatchEvent(new KeyboardEvent('keyup', {key: key, bubbles: true}));
+    entry.dispatchEvent(new Event('change', {bubbles: true}));
+}
+return true;
+'''
+
+# Same check as get_verdict: the second completion popup shows a completion time once the board is solved
+COMPLETED_SCRIPT = '''
+const completion = document.getElementsByClassName('completion_element_center')[1];
+const time = completion && completion.querySelector('#completion_time');
+return !!time && time.textContent.trim() !== '';
+'''
+
+def inject_answer(browser, answer):
+    '''
+    Enter the whole answer with a single script execution and wait for the page to acknowledge it.
+    Returns False (with the board cleared again) when the page doesn't take it.
+    '''
+    from selenium.webdriver.support.ui import WebDriverWait
+    try:
+        if browser.execute_script(INJECT_SCRIPT, answer):
+            WebDriverWait(browser, INJECT_TIMEOUT, poll_frequency=POLL_INTERVAL).until(lambda d: d.execute_script(COMPLETED_SCRIPT))
+            return True
+    except Exception as e:
+        logging.info(f'{type(e).__name__}: {e}')
+    try:
+        browser.execute_script(INJECT_SCRIPT, '.'*len(answer))
+    except Exception as e:
+        logging.info(f'{type(e).__name__}: {e}')
+    return False
 
-    # parse source page
-    t1 = time.time()
-    logging.info('Source page obtained! Parsing source page now...')
-    soup = BeautifulSoup(browser.page_source, 'html.parser')
-    rules = parse(soup, n)
-    logging.info(f'Ruleset obtained!')
-    for ax in 'xyz':
-        print(f'Rules for {ax} axis:', flush=True)
-        for rule in rules[ax]:
-            print('\t', rule, flush=True)
-    print(flush=True)
-
-    # prep Unregexle
-    t2 = time.time()
-    answer, correct = solve(rules, n)
-    logging.info('Candidate answer:\n')
-    print(format_answer(answer, n), flush=True)
-    print(flush=True)
-
-    # apply solution!
-    t3 = time.time()
-    if not correct:
-        print('Unregexle is not powerful enough to solve this menace :(\n', flush=True)
-        return round(t2-t1, 5), round(t3-t2, 5), None, None, False
-    if quick:
-        print(f'Unregexle has solved Regexle side={n}\n', flush=True)
-        message = '\n'.join([
-            f'[regexle.com]({link})',
-            format_answer(answer, n, spoiler=True)
-        ])
-        return round(t2-t1, 5), round(t3-t2, 5), None, None, True
+def type_answer(browser, answer):
+    from selenium.webdriver import ActionChains
+    from selenium.webdriver.common.by import By
     hexagons = browser.find_elements(By.CLASS_NAME, 'board_entry')
     chains = ActionChains(browser)
     chains.click(hexagons[0])
@@ -464,10 +373,20 @@ def run(n, day, spoiler, quick, supplier):
         if idx % 100 == 0:
             chains.perform() # to avoid timeout error
     chains.perform()
+
+def enter_answer(browser, answer, n, inject=False):
+    '''
+    Type the answer in, or with `inject` try filling the board with a single script first
+    '''
+    if not inject:
+        type_answer(browser, answer)
+    elif not inject_answer(browser, answer):
+        logging.info('The page did not take the injected answer, typing it instead...')
+        type_answer(browser, answer)
     logging.info(f'Solution for Regexle side={n} applied!')
 
-    # share results! reload browser page
-    t4 = time.time()
+def get_verdict(browser, answer, n, link, spoiler):
+    from bs4 import BeautifulSoup
     contents = []
     soup = BeautifulSoup(browser.page_source, 'html.parser')
     completion = soup.findAll('div', class_='completion_element_center')[1]
@@ -481,18 +400,122 @@ def run(n, day, spoiler, quick, supplier):
         contents.append(format_answer(answer, n, spoiler=True))
     else:
         contents.append(format_answer('🟩'*(3*n**2-3*n+1), n, space=False).replace(' ', ' '*3))
+    return '\n'.join(contents)
 
-    browser.quit()
-    logging.info(f'All done!')
-    return round(t2-t1, 5), round(t3-t2, 5), round(t4-t3, 5), '\n'.join(contents), True
+def wait_for_rollover(pool, link, n, warm_browser):
+    '''
+    Get everything ready before 4PM GMT (solver tables built, HTTP connection open, a browser launched if `warm_browser`),
+    sleep until then and poll `link` until it serves a new puzzle. Returns right away if it is already past 4PM GMT.
+    '''
+    if time.time()%86400 >= ROLLOVER:
+        return
+    get_geometry(n)
+    if warm_browser:
+        pool.give_back(pool.borrow())
+    previous = get_rule_texts(get_page_source(pool, link, n))
+
+    remaining = ROLLOVER - time.time()%86400
+    logging.info(f'Ready, sleeping {round(remaining, 3)}s until the new puzzle...')
+    time.sleep(remaining)
+    deadline = time.time() + ROLLOVER_TIMEOUT
+    while time.time() < deadline:
+        try:
+            if get_rule_texts(get_page_source(pool, link, n)) != previous:
+                logging.info(f'New puzzle served {round(time.time()%86400-ROLLOVER, 3)}s after rollover')
+                return
+        except Exception as e:
+            logging.info(f'{type(e).__name__}: {e}')
+        time.sleep(ROLLOVER_POLL)
+    logging.info(f'Still the same puzzle after {ROLLOVER_TIMEOUT}s, going ahead anyway')
+
+def run(n, day, spoiler, quick, pool, time_limit, source=REGEXLE_URL, corpus=None, cache=CACHE_PATH, profile=False, inject=False):
+    t0 = time.time()
+    link = f'{source}/?side={n}&day={day}'
+    browser = None
+    try:
+        if quick:
+            page_source = get_page_source(pool, link, n)
+        else:
+            browser = load_page(pool, link, n)
+            page_source = browser.page_source
+
+        # parse source page
+        t1 = time.time()
+        logging.info(f'Source page obtained after {round(t1-t0, 5)}s! Parsing source page now...')
+        rules = parse(page_source, n)
+        if corpus:
+            save_rules(corpus, n, day, rules)
+        logging.info(f'Ruleset obtained!')
+        for ax in 'xyz':
+            print(f'Rules for {ax} axis:', flush=True)
+            for rule in rules[ax]:
+                print('\t', rule[0], rule[2], flush=True)
+        print(flush=True)
 
-def main(n, day, spoiler, quick):
+        # prep Unregexle
+        t2 = time.time()
+        cached = get_cached_answer(cache, n, day, rules) if cache else None
+        stats = {} if profile else None
+        if cached:
+            answer, correct = cached[0], True
+            logging.info(f'Answer found in cache, it took {cached[1]}s to solve')
+        else:
+            answer, correct = solve(rules, n, time_limit, stats, verbose=True)
+            if correct and cache:
+                put_cached_answer(cache, n, day, rules, answer, round(time.time()-t2, 5))
+        if profile:
+            print(json.dumps({'side': n, 'day': get_puzzle_day(day), 't_load': round(t1-t0, 5), 't_parse': round(t2-t1, 5),
+                't_algo': round(time.time()-t2, 5), 'solved': correct, 'cached': bool(cached), 'solve': stats}), flush=True)
+        logging.info('Candidate answer:\n')
+        print(format_answer(answer, n), flush=True)
+        print(flush=True)
+
+        # apply solution!
+        t3 = time.time()
+        if not correct:
+            print('Unregexle is not powerful enough to solve this menace :(\n', flush=True)
+            if not quick:
+                pool.give_back(browser)
+            return round(t1-t0, 5), round(t2-t1, 5), round(t3-t2, 5), None, None, False
+        if quick:
+            print(f'Unregexle has solved Regexle side={n}\n', flush=True)
+            return round(t1-t0, 5), round(t2-t1, 5), round(t3-t2, 5), None, None, True
+        enter_answer(browser, answer, n, inject)
+
+        # share results!
+        t4 = time.time()
+        verdict = get_verdict(browser, answer, n, link, spoiler)
+        pool.give_back(browser)
+        logging.info(f'All done!')
+        return round(t1-t0, 5), round(t2-t1, 5), round(t3-t2, 5), round(t4-t3, 5), verdict, True
+    except Exception:
+        # whatever went wrong, the browser isn't left behind with a half done page
+        if browser != None:
+            pool.give_back(browser, healthy=False)
+        raise
+
+def get_credentials():
+    '''
+    The Telegram bot token and comma separated chat ids, from the environment or else from env.py
+    '''
+    try:
+        return os.environ['TOKEN'], os.environ['CHATS']
+    except KeyError:
+        from env import TOKEN, CHATS
+        return TOKEN, CHATS
+
+def get_supplier():
     curr_os = (pf:=platform.platform())[:pf.find('-')]
     supplier = {'Windows': get_windows_browser, 'Linux': get_linux_browser}.get(curr_os)
     assert supplier, f'Unregexle not supported for {curr_os} yet :('
+    return supplier
 
-    t_parse, t_algo, t_selenium, verdict, solved = loop_resolve(run, lambda: None, ATTEMPT_LIMIT, n, day, spoiler, quick, supplier)
+def main(n, day, spoiler, quick, time_limit=SEARCH_TIME_LIMIT, source=REGEXLE_URL, corpus=None, cache=CACHE_PATH, profile=False, inject=False):
+    pool = get_pool(get_supplier())
 
+    t_load, t_parse, t_algo, t_selenium, verdict, solved = loop_resolve(run, lambda: None, ATTEMPT_LIMIT, n, day, spoiler, quick, pool, time_limit, source, corpus, cache, profile, inject)
+
+    print(f'Time to load Unregexle board: {t_load}', flush=True)
     print(f'Time to parse Unregexle board: {t_parse}', flush=True)
     print(f'Time to run backtracking: {t_algo}', flush=True)
     if verdict != None:
@@ -500,17 +523,11 @@ def main(n, day, spoiler, quick):
         print(verdict.replace(' '*3, ' '), flush=True)
 
         # Telebot integration
-        for chat_id in CHATS.split(','):
-            send(TOKEN, chat_id, f'{verdict}\n\n#unregexle' \
-                    .replace('.', '\\.') \
-                    .replace('*', '\\*') \
-                    .replace('#', '\\#') \
-                    .replace('+', '\\+') \
-                    .replace('-', '\\-') \
-                    .replace('=', '\\=')
-                )
-
-    return t_parse, t_algo, t_selenium, verdict, solved
+        from notify import escape, notify
+        token, chats = get_credentials()
+        notify(token, chats.split(','), escape(f'{verdict}\n\n#unregexle'))
+
+    return t_load, t_parse, t_algo, t_selenium, verdict, solved
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(prog='unregexle', description='Solve Regexle in no time')
@@ -519,13 +536,17 @@ if __name__ == '__main__':
     parser.add_argument('-s', '--spoiler', default=0, help='Enable spoilers in output (0 or 1)')
     parser.add_argument('-q', '--quick', default=0, help='Enable quick mode to ignore the Selenium typing part (0 or 1)')
     parser.add_argument('-c', '--cron', default=0, help='Delay solving until new day (0 or 1)')
+    parser.add_argument('-t', '--time-limit', default=SEARCH_TIME_LIMIT, help='Time budget in seconds for the backtracking fallback')
+    parser.add_argument('-u', '--url', default=REGEXLE_URL, help='Where to get the puzzle from (e.g. a local fixture_server.py)')
+    parser.add_argument('--corpus', default=None, help='Directory to save the parsed ruleset to, for bench.py')
+    parser.add_argument('--cache', default=CACHE_PATH, help='SQLite file of solved puzzles to reuse (empty to disable)')
+    parser.add_argument('-p', '--profile', default=0, help='Print per-phase solver counters and timings as JSON (0 or 1)')
+    parser.add_argument('-i', '--inject', default=0, help='Try entering the answer with a single script before typing it (0 or 1)')
     args = parser.parse_args()
     n = int(args.side)
     assert 1 <= n <= 32, 'Size must be between 1 and 32 inclusively'
 
     if int(args.cron):
-        while (t:=int(time.time()%86400))//3600 < 16: # not 4PM GMT yet
-            time.sleep(10)
-            logging.info(f'Waiting... Current time: {str(t//3600).zfill(2)}:{str(t//60%60).zfill(2)}:{str(t%60).zfill(2)} GMT')
+        wait_for_rollover(get_pool(get_supplier()), f'{args.url}/?side={n}&day={args.day}', n, warm_browser=not int(args.quick))
 
-    main(n, args.day, int(args.spoiler), int(args.quick))
+    main(n, args.day, int(args.spoiler), int(args.quick), float(args.time_limit), args.url, args.corpus, args.cache, int(args.profile), int(args.inject))
@@ -0,0 +1,71 @@
+import functools
+import logging
+import os
+import requests
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+TELEGRAM_API = os.environ.get('TELEGRAM_API', 'https://api.telegram.org')
+SEND_ATTEMPTS = 4
+BACKOFF = 0.5
+HTTP_TIMEOUT = 10
+MAX_WORKERS = 8
+
+def escape(text, markup=True):
+    '''
+    Escape `text` for MarkdownV2.
+    With `markup`, brackets and parentheses are left alone so that [links](...) in the message keep working.
+    '''
+    for ch in '.*#+-=' + ('' if markup else '()[]'):
+        text = text.replace(ch, '\\'+ch)
+    return text
+
+@functools.lru_cache(maxsize=None)
+def get_session():
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=MAX_WORKERS)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+def send(token, chat_id, bot_message, api=TELEGRAM_API):
+    '''
+    Send `bot_message` to one chat, waiting as long as Telegram asks on 429
+    and backing off exponentially on timeouts, connection errors and 5xx.
+    Returns whether the message went through.
+    '''
+    for attempt in range(SEND_ATTEMPTS):
+        delay = BACKOFF * 2**attempt
+        try:
+            resp = get_session().get(f'{api}/bot{token}/sendMessage', params={
+                'chat_id': chat_id,
+                'parse_mode': 'MarkdownV2',
+                'text': bot_message,
+                'disable_web_page_preview': False
+                }, timeout=HTTP_TIMEOUT)
+        except requests.RequestException as e:
+            logging.info(f'{chat_id} - {type(e).__name__}: {e}')
+        else:
+            if resp.ok:
+                logging.info(f'{resp.status_code} - {resp.ok}')
+                return True
+            try:
+                body = resp.json()
+            except ValueError:
+                body = {}
+            logging.info(f"{resp.status_code} - {body.get('description')}")
+            if resp.status_code == 429:
+                delay = body.get('parameters', {}).get('retry_after', delay)
+            elif resp.status_code < 500:
+                return False
+        if attempt+1 < SEND_ATTEMPTS:
+            time.sleep(delay)
+    return False
+
+def notify(token, chats, bot_message, api=TELEGRAM_API):
+    '''
+    Send `bot_message` to all `chats` concurrently, returns the chats it could not be delivered to
+    '''
+    with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(chats))) as executor:
+        delivered = list(executor.map(lambda chat_id: send(token, chat_id, bot_message, api), chats))
+    return [chat_id for chat_id, ok in zip(chats, delivered) if not ok]
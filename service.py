@@ -0,0 +1,95 @@
+import argparse
+import functools
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from solver import get_geometry, load_rules, solve, SEARCH_TIME_LIMIT
+
+RULES_CACHE_SIZE = 256
+
+class MalformedRuleset(ValueError):
+    pass
+
+def warm_up(sides):
+    '''
+    Runs once in every worker, so that the first request of each side doesn't pay for its geometry
+    '''
+    for n in sides:
+        get_geometry(n)
+
+@functools.lru_cache(maxsize=RULES_CACHE_SIZE)
+def get_rules(texts):
+    '''
+    Compiled rules of a ruleset, kept per worker so that asking for the same puzzle again skips the compiling.
+    Raises MalformedRuleset for rules that don't compile, so that the client gets told off rather than a server error.
+    '''
+    try:
+        return load_rules(json.loads(texts))
+    except Exception as e:
+        raise MalformedRuleset(f'{type(e).__name__}: {e}')
+
+def solve_puzzle(n, texts, time_limit):
+    t0 = time.perf_counter()
+    rules = get_rules(texts)
+    t1 = time.perf_counter()
+    answer, solved = solve(rules, n, time_limit)
+    return {'side': n, 'answer': answer, 'solved': solved, 't_compile': round(t1-t0, 5), 't_algo': round(time.perf_counter()-t1, 5)}
+
+def read_puzzle(body):
+    '''
+    The (side, rule texts as a canonical JSON string, time limit) of a request body like {"side": 3, "rules": {"x": [...], ...}}
+    '''
+    puzzle = json.loads(body)
+    n, texts = int(puzzle['side']), puzzle['rules']
+    assert n >= 1, 'Size must be at least 1'
+    for ax in 'xyz':
+        assert len(texts[ax]) == 2*n-1 and all(isinstance(text, str) for text in texts[ax]), f'Expected {2*n-1} rules for the {ax} axis'
+    return n, json.dumps({ax: texts[ax] for ax in 'xyz'}), float(puzzle.get('time_limit', SEARCH_TIME_LIMIT))
+
+class SolverHandler(BaseHTTPRequestHandler):
+    '''
+    POST /solve with a ruleset in the corpus format (plus an optional time_limit) and get back
+    {"side", "answer", "solved", "t_compile", "t_algo", "t_total"}.
+    Requests are handled on their own threads and solved on the worker processes of `executor`.
+    '''
+    executor = None
+
+    def do_POST(self):
+        t = time.perf_counter()
+        if self.path != '/solve':
+            return self.reply(404, {'error': 'Not Found'})
+        try:
+            n, texts, time_limit = read_puzzle(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+        except Exception as e:
+            return self.reply(400, {'error': f'{type(e).__name__}: {e}'})
+        try:
+            result = self.executor.submit(solve_puzzle, n, texts, time_limit).result()
+        except MalformedRuleset as e:
+            return self.reply(400, {'error': f'Malformed ruleset: {e}'})
+        except Exception as e:
+            return self.reply(500, {'error': f'{type(e).__name__}: {e}'})
+        result['t_total'] = round(time.perf_counter()-t, 5)
+        self.reply(200, result)
+
+    def reply(self, status, body):
+        body = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog='service', description='Keep the solver running and answer rulesets over HTTP')
+    parser.add_argument('-p', '--port', default=8090, help='Port to listen on')
+    parser.add_argument('-w', '--workers', default=os.cpu_count(), help='Number of puzzles solved in parallel')
+    args = parser.parse_args()
+
+    with ProcessPoolExecutor(max_workers=int(args.workers), initializer=warm_up, initargs=(range(1, 33),)) as executor:
+        list(executor.map(get_geometry, range(1, 33))) # start the workers now rather than on the first requests
+        SolverHandler.executor = executor
+        server = ThreadingHTTPServer(('127.0.0.1', int(args.port)), SolverHandler)
+        print(f'Solver on http://127.0.0.1:{args.port}/solve', flush=True)
+        server.serve_forever()
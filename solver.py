@@ -0,0 +1,552 @@
+import argparse
+import collections
+import functools
+import json
+import logging
+import re
+import string
+import sys
+import time
+
+# Constants
+LETTER_BIT = {ch: 1<<i for i, ch in enumerate(string.ascii_uppercase)}
+ALL_LETTERS = (1<<26)-1
+NOISE_LIMIT = 10
+TRIE_END = '$'
+SEARCH_TIME_LIMIT = 60
+
+def handle_qn_and_sq(s):
+    '''
+    Store the blocks of a mode 1 rule in a trie instead of expanding every ? and [..] into plain strings.
+    Each edge is a (letter mask, optional) item, so a block with k optional characters stays a single path
+    instead of 2^k strings, and blocks sharing a prefix share its edges.
+    A node is a dict from items to child nodes, with TRIE_END in it when a block can end there.
+
+    E.g. (AB?C|A[BC]D)+ becomes A -> B? -> C -> TRIE_END
+                                  -> [BC] -> D -> TRIE_END
+    '''
+    trie = {}
+    for v in s:
+        node, idx = trie, 0
+        while idx < len(v):
+            if v[idx] == '[':
+                end = v.index(']', idx)
+                mask, idx = letters_to_mask(v[idx+1:end]), end+1
+            else:
+                mask, idx = LETTER_BIT[v[idx]], idx+1
+            optional = idx < len(v) and v[idx] == '?'
+            idx += optional
+            node = node.setdefault((mask, optional), {})
+        node[TRIE_END] = True
+    return trie
+
+def make_rule(text):
+    text = text.strip()
+    if text[0] == '.':
+        mode, blocks = 0, [s for s in text.split('.*') if s]                # .*r1.*r2.*
+    else:
+        mode, blocks = 1, handle_qn_and_sq(text[1:-2].split('|'))           # (r1|r2|...)+
+    automaton = compile_rule(text) if mode == 0 else compile_trie(blocks)
+    return mode, blocks, text, automaton, re.compile(text)
+
+def load_rules(texts):
+    '''
+    Build the same rules as `parse` from the plain rule texts of each axis, e.g. from the corpus
+    '''
+    return {ax: [make_rule(text) for text in texts[ax]] for ax in 'xyz'}
+
+def letters_to_mask(letters):
+    mask = 0
+    for ch in letters: mask |= LETTER_BIT[ch]
+    return mask
+
+def mask_to_bits(mask):
+    while mask:
+        yield mask & -mask
+        mask &= mask-1
+
+def is_single(mask):
+    return mask & (mask-1) == 0
+
+def mask_to_letter(mask):
+    '''
+    The letter of a fully determined cell, or '.' if there are still several candidates
+    '''
+    return string.ascii_uppercase[mask.bit_length()-1] if mask and is_single(mask) else '.'
+
+@functools.lru_cache(maxsize=None)
+def get_geometry(n):
+    '''
+    Precompute the board geometry for side `n`, cached since it never changes.
+
+    Hexagons are numbered row by row into a flat board of 3n^2-3n+1 cells.
+    Returns (rows, lines, cell_lines) where
+        rows[i]          = (start, end) of row i in the flat board
+        lines[ax][k]     = flat cell indices of row `k` in axis `ax`, in rule order
+        cell_lines[c][a] = (k, pos) of cell `c` in the a-th axis of 'xyz'
+    '''
+    rows, start = [], 0
+    for i in range(2*n-1):
+        rows.append((start, start+2*n-1-abs(n-1-i)))
+        start = rows[-1][1]
+    cell = lambda i, j: rows[i][0]+j
+
+    lines = {ax: [] for ax in 'xyz'}
+    for i in range(2*n-1):
+        r = range(max(i-n+1, 0), min(2*n-1, n+i))
+        lines['x'].append(tuple(cell(j, i-max(j-n+1, 0)) for j in reversed(r)))
+        lines['y'].append(tuple(range(*rows[i])))
+        lines['z'].append(tuple(cell((-j-1)%(2*n-1), i-max(j-n+1, 0)) for j in reversed(r)))
+
+    cell_lines = [[None]*3 for _ in range(start)]
+    for a, ax in enumerate('xyz'):
+        for k, line in enumerate(lines[ax]):
+            for pos, c in enumerate(line):
+                cell_lines[c][a] = (k, pos)
+    return tuple(rows), {ax: tuple(lines[ax]) for ax in 'xyz'}, tuple(map(tuple, cell_lines))
+
+def compile_rule(text):
+    '''
+    Compile a rule into a position (Glushkov) automaton so that any line can be checked against it
+    with a forward/backward pass instead of backtracking over the blocks.
+
+    Supports letters, '.', character classes [..], groups, alternation and the *, + and ? operators,
+    which covers both .*r1.*r2.* and (r1|r2)+ with their optional characters and choices.
+    Every letter (or '.' or class) in the rule becomes one state, state 0 being the start state.
+    Returns (follow, letters, accept, preceding, by_letter) where
+        follow[q]    = bitset of states that can come right after state q
+        letters[p]   = mask of letters that can be read when entering state p
+        accept       = bitset of states the whole line can end in
+        preceding[p] = bitset of states q such that p is in follow[q]
+        by_letter[b] = bitset of states that can read the b-th letter
+    '''
+    follow, letters = [0], [0]
+    idx = 0
+
+    def add_state(mask):
+        follow.append(0)
+        letters.append(mask)
+        return 1<<(len(letters)-1)
+
+    def link(last, first):
+        while last:
+            low = last & -last
+            follow[low.bit_length()-1] |= first
+            last ^= low
+
+    # each of these returns (nullable, first, last) of the sub-expression read
+    def read_alt():
+        nonlocal idx
+        nullable, first, last = read_concat()
+        while idx < len(text) and text[idx] == '|':
+            idx += 1
+            nxt = read_concat()
+            nullable, first, last = nullable or nxt[0], first | nxt[1], last | nxt[2]
+        return nullable, first, last
+
+    def read_concat():
+        nullable, first, last = True, 0, 0
+        while idx < len(text) and text[idx] not in '|)':
+            nxt = read_repeat()
+            link(last, nxt[1])
+            first |= nxt[1] if nullable else 0
+            last = nxt[2] | (last if nxt[0] else 0)
+            nullable = nullable and nxt[0]
+        return nullable, first, last
+
+    def read_repeat():
+        nonlocal idx
+        nullable, first, last = read_atom()
+        while idx < len(text) and text[idx] in '*+?':
+            if text[idx] != '?':
+                link(last, first)
+            nullable = nullable or text[idx] != '+'
+            idx += 1
+        return nullable, first, last
+
+    def read_atom():
+        nonlocal idx
+        ch = text[idx]
+        idx += 1
+        if ch == '(':
+            result = read_alt()
+            if idx >= len(text) or text[idx] != ')':
+                raise ValueError(f'Unbalanced parenthesis in rule {text}')
+            idx += 1
+            return result
+        if ch == '[':
+            end = text.index(']', idx)
+            state = add_state(letters_to_mask(text[idx:end]))
+            idx = end+1
+        elif ch == '.':
+            state = add_state(ALL_LETTERS)
+        elif ch in LETTER_BIT:
+            state = add_state(LETTER_BIT[ch])
+        else:
+            raise ValueError(f'Unsupported character {ch!r} in rule {text}')
+        return False, state, state
+
+    nullable, first, last = read_alt()
+    if idx != len(text):
+        raise ValueError(f'Unbalanced parenthesis in rule {text}')
+    follow[0] = first
+    return finish_automaton(follow, letters, last | nullable)
+
+def compile_trie(trie):
+    '''
+    Same as `compile_rule` but straight from the trie of a mode 1 rule (see `handle_qn_and_sq`),
+    with one state per trie edge so that blocks sharing a prefix also share its states.
+    Reaching a node where a block can end allows to go on with the first item of any block, hence the +.
+    '''
+    follow, letters, edges = [0], [0], []
+
+    def visit(node):
+        # returns (first, ends) of `node`: the states that can be entered next,
+        # and whether the block can end here without reading anything else
+        first, ends = 0, TRIE_END in node
+        for item, child in node.items():
+            if item == TRIE_END:
+                continue
+            state = 1<<len(letters)
+            follow.append(0)
+            letters.append(item[0])
+            child_first, child_ends = visit(child)
+            edges.append((state, child_first, child_ends))
+            first |= state
+            if item[1]:
+                first |= child_first
+                ends = ends or child_ends
+        return first, ends
+
+    root_first, root_ends = visit(trie)
+    follow[0], accept = root_first, root_ends
+    for state, child_first, child_ends in edges:
+        follow[state.bit_length()-1] = child_first | (root_first if child_ends else 0)
+        accept |= state if child_ends else 0
+    return finish_automaton(follow, letters, accept)
+
+def finish_automaton(follow, letters, accept):
+    '''
+    Helper function to add the lookup tables used by `derive_line` to an automaton, see `compile_rule`
+    '''
+    preceding = [0]*len(letters)
+    by_letter = [0]*len(LETTER_BIT)
+    for q in range(len(letters)):
+        for b in range(len(LETTER_BIT)):
+            if letters[q]>>b & 1:
+                by_letter[b] |= 1<<q
+    for p in range(len(letters)):
+        for q in range(len(letters)):
+            if follow[q]>>p & 1:
+                preceding[p] |= 1<<q
+    return follow, letters, accept, preceding, by_letter
+
+def instrument(profile, name, f):
+    '''
+    Wrap `f` so that every call adds to profile[name]['calls'] and its wall time to profile[name]['time'].
+    Times are inclusive of whatever `f` calls, and recursive calls are only timed at the outermost level.
+    '''
+    entry = profile.setdefault(name, {'calls': 0, 'time': 0.0})
+    depth = 0
+    @functools.wraps(f)
+    def wrapper(*args, **kwargs):
+        nonlocal depth
+        entry['calls'] += 1
+        if depth:
+            return f(*args, **kwargs)
+        depth += 1
+        t = time.perf_counter()
+        try:
+            return f(*args, **kwargs)
+        finally:
+            entry['time'] += time.perf_counter()-t
+            depth -= 1
+    return wrapper
+
+def solve(rules, n, time_limit=SEARCH_TIME_LIMIT, profile=None, verbose=False):
+    rows, lines, cell_lines = get_geometry(n)
+    board = [ALL_LETTERS]*rows[-1][1]
+    line_ok = {(ax, k): None for ax in 'xyz' for k in range(2*n-1)}
+    changed, trail = set(), []
+
+    def derive_line(tmp, automaton):
+        '''
+        Narrow down the candidate masks `tmp` of a line with the compiled rule.
+
+        A forward pass collects the states reachable after reading each prefix of the line,
+        then a backward pass keeps only those that can still finish in an accepting state.
+        The letters leading into the surviving states are exactly the feasible letters per cell,
+        all in O(len(line) * states) regardless of how the blocks could be placed.
+
+        Example:
+            tmp = ['.', 'A', 'B', 'C', '.', '.']
+            rule = (ABC|E|FG|HI)+
+
+            Only 'E' fits before ABC and only FG or HI fit after it
+            ['E', 'A', 'B', 'C', '{F,H}', '{G,I}']
+
+        Returns None if the line can't be matched at all.
+        '''
+        follow, letters, accept, preceding, by_letter = automaton
+        fwd = [1]
+        for mask in tmp:
+            cur, nxt = fwd[-1], 0
+            while cur:
+                low = cur & -cur
+                nxt |= follow[low.bit_length()-1]
+                cur ^= low
+            if mask != ALL_LETTERS:
+                allowed = 0
+                for bit in mask_to_bits(mask):
+                    allowed |= by_letter[bit.bit_length()-1]
+                nxt &= allowed
+            fwd.append(nxt)
+        back = fwd[-1] & accept
+        if not back:
+            return None
+        sols = [0]*len(tmp)
+        for i in range(len(tmp)-1, -1, -1):
+            cur, mask, prev = back, 0, 0
+            while cur:
+                low = cur & -cur
+                p = low.bit_length()-1
+                mask |= letters[p]
+                prev |= preceding[p]
+                cur ^= low
+            sols[i] = mask & tmp[i]
+            back = prev & fwd[i]
+        return sols
+
+    def get_current_exp(ax, k):
+        '''
+        Helper function to get the state of row `k` in the given axis `ax`
+        '''
+        return ''.join(map(mask_to_letter, get_current_masks(ax, k)))
+
+    def get_current_masks(ax, k):
+        '''
+        Helper function to get the candidate masks of row `k` in the given axis `ax`
+        '''
+        return [board[c] for c in lines[ax][k]]
+
+    def get_clusters():
+        '''
+        Helper function to group the unresolved hexagons, two of them being in the same group
+        whenever they share a line (directly or through other unresolved hexagons)
+        '''
+        clusters, seen = [], set()
+        for c in range(len(board)):
+            if is_single(board[c]) or c in seen:
+                continue
+            cluster, stack = [], [c]
+            seen.add(c)
+            while stack:
+                c2 = stack.pop()
+                cluster.append(c2)
+                for a, ax in enumerate('xyz'):
+                    for c3 in lines[ax][cell_lines[c2][a][0]]:
+                        if not is_single(board[c3]) and c3 not in seen:
+                            seen.add(c3)
+                            stack.append(c3)
+            clusters.append(cluster)
+        return clusters
+
+    def propagate(dirty):
+        '''
+        Narrow down the `dirty` lines until nothing changes anymore,
+        scheduling the other two lines of every hexagon that got narrowed down on the way.
+        Lines are derived first come first served, so each one sees as much as possible from the others.
+        Returns False as soon as one of the lines can't be matched anymore.
+        '''
+        pending, queued = collections.deque(dirty), set(dirty)
+        while pending:
+            ax, k = pending.popleft()
+            queued.discard((ax, k))
+            sol = derive_line(get_current_masks(ax, k), rules[ax][k][3])
+            if sol == None:
+                return False
+            for c, mask in zip(lines[ax][k], sol):
+                if mask != board[c]:
+                    set_mask(c, mask)
+                    for a, ax2 in enumerate('xyz'):
+                        if (line := (ax2, cell_lines[c][a][0])) not in queued:
+                            queued.add(line)
+                            pending.append(line)
+        return True
+
+    def fix_cell(c, bit):
+        '''
+        Put `bit` in hexagon `c` and propagate it through the board.
+        Every change goes to the trail, so the caller can take it back with `undo`.
+        '''
+        set_mask(c, bit)
+        return propagate([(ax, cell_lines[c][a][0]) for a, ax in enumerate('xyz')])
+
+    def undo(mark):
+        '''
+        Helper function to restore the board as it was when the trail was `mark` long
+        '''
+        while len(trail) > mark:
+            c, mask = trail.pop()
+            board[c] = mask
+            changed.add(c)
+
+    def cancel_noise():
+        '''
+        Whatever is left unresolved is split into groups of hexagons sharing lines,
+        and each small enough group is finished off with a search that only tries candidate letters
+        and rejects a guess as soon as propagating it runs into a line that can't be matched.
+        This should resolve the issues found on smaller boards with non-unique solutions (e.g. n=2 or n=3)
+        '''
+        def backtrack(cluster, idx):
+            if idx == len(cluster):
+                return True
+            c = cluster[idx]
+            for bit in mask_to_bits(board[c]):
+                mark = len(trail)
+                if fix_cell(c, bit) and backtrack(cluster, idx+1):
+                    return True
+                undo(mark)
+            return False
+
+        for cluster in get_clusters():
+            if len(cluster) <= NOISE_LIMIT:
+                cluster.sort(key=lambda c: board[c].bit_count())
+                backtrack(cluster, 0)
+
+    def search(deadline):
+        '''
+        Last resort for whatever the rounds couldn't finish: a full backtracking over the board,
+        always guessing on the unresolved hexagon with the fewest candidates left
+        and propagating every guess before going deeper.
+        Raises TimeoutError once `deadline` is reached.
+
+        The guesses in progress are kept on an explicit stack rather than the call stack,
+        since a big board can need one level per hexagon.
+        '''
+        guesses = [] # (hexagon, trail length before guessing on it, candidates not tried yet) of every open guess
+        ok = True
+        while True:
+            if time.time() > deadline:
+                raise TimeoutError(f'Search gave up after {time_limit}s')
+            if ok:
+                unresolved = [c for c in range(len(board)) if not is_single(board[c])]
+                if not unresolved:
+                    if validate(verbose=False):
+                        return True
+                else:
+                    c = min(unresolved, key=lambda c: board[c].bit_count())
+                    guesses.append((c, len(trail), mask_to_bits(board[c])))
+            # next candidate of the innermost guess that has one left, taking back everything guessed after it
+            while guesses:
+                c, mark, bits = guesses[-1]
+                undo(mark)
+                if (bit := next(bits, None)) != None:
+                    break
+                guesses.pop()
+            else:
+                return False
+            ok = fix_cell(c, bit)
+
+    def set_mask(c, mask):
+        '''
+        Helper function to update hexagon `c`, keeping track of it for the next validation and for `undo`
+        '''
+        trail.append((c, board[c]))
+        board[c] = mask
+        changed.add(c)
+
+    def validate(verbose=True):
+        '''
+        Validate current answer with the regex rules, which only passes once every hexagon is resolved
+        since an unresolved one shows up as a '.' that the rules would happily match.
+        Only the lines crossing hexagons changed since the previous call are matched again,
+        the others keep their previous verdict in `line_ok`.
+        '''
+        for c in changed:
+            for a, ax in enumerate('xyz'):
+                line_ok[(ax, cell_lines[c][a][0])] = None
+        changed.clear()
+        for (ax, k), ok in line_ok.items():
+            if ok == None:
+                line_ok[(ax, k)] = bool(rules[ax][k][4].fullmatch(get_current_exp(ax, k)))
+        if verbose:
+            for (ax, k), ok in line_ok.items():
+                if not ok:
+                    print(ax, k, rules[ax][k][2], get_current_exp(ax, k), flush=True)
+        return all(line_ok.values()) and '.' not in display()
+
+    def display():
+        '''
+        Helper function to display the current answer based on the state of `board`
+        '''
+        return ''.join(map(mask_to_letter, board))
+
+    def debug_hexagon():
+        print(format_answer(display(), n), flush=True)
+        print(flush=True)
+
+    # The strategy is to narrow down every line with its own rule,
+    # which also takes care of the outer hexagons since the rules are anchored at both ends.
+    # Whenever a hexagon gets narrowed down, only the lines crossing it are derived again,
+    # until nothing changes anymore. Whatever is left is up to the searches.
+    # When profiling, the helpers above are swapped for counting wrappers,
+    # so there is nothing to pay for it otherwise
+    if profile != None:
+        derive_line = instrument(profile, 'derive_line', derive_line)
+        propagate = instrument(profile, 'propagate', propagate)
+        fix_cell = instrument(profile, 'fix_cell', fix_cell)
+        undo = instrument(profile, 'undo', undo)
+        cancel_noise = instrument(profile, 'cancel_noise', cancel_noise)
+        search = instrument(profile, 'search', search)
+        validate = instrument(profile, 'validate', validate)
+        resolved = profile.setdefault('resolved', {})
+        count_resolved = lambda: sum(map(is_single, board))
+
+    propagate([(ax, k) for ax in 'xyz' for k in range(2*n-1)])
+    if profile != None: resolved['propagate'] = count_resolved()
+    if '.' in display():
+        cancel_noise()
+        if profile != None: resolved['cancel_noise'] = count_resolved()
+    if '.' in display():
+        mark = len(trail)
+        try:
+            search(time.time()+time_limit)
+        except TimeoutError as e:
+            logging.info(e)
+            undo(mark)
+        if profile != None: resolved['search'] = count_resolved()
+        #debug_hexagon()
+    return display(), validate(verbose)
+
+def format_answer(answer, n, space=True, spoiler=False):
+    idx = 0
+    rows = []
+    for i in range(2*n-1):
+        tmp = ['||'] if spoiler else [' '*abs(n-1-i)]
+        for j in range(2*n-1-abs(n-1-i)):
+            tmp.append((answer[idx] if idx < len(answer) else '.')+' '*space)
+            idx += 1
+        if spoiler:
+            tmp.append('||')
+        rows.append(''.join(tmp))
+    return '\n'.join(rows)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog='solver', description='Solve a Regexle ruleset without any browser')
+    parser.add_argument('path', nargs='?', default=None, help='Ruleset JSON as saved in the corpus, read from stdin if left out')
+    parser.add_argument('-t', '--time-limit', default=SEARCH_TIME_LIMIT, help='Time budget in seconds for the backtracking fallback')
+    parser.add_argument('-b', '--board', default=0, help='Print the answer laid out as the hexagon instead of a single line (0 or 1)')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='[%(asctime)s] %(message)s', datefmt='%H:%M:%S')
+
+    if args.path:
+        with open(args.path) as f:
+            puzzle = json.load(f)
+    else:
+        puzzle = json.load(sys.stdin)
+    n = puzzle['side']
+    answer, solved = solve(load_rules(puzzle['rules']), n, float(args.time_limit))
+    print(format_answer(answer, n) if int(args.board) else answer)
+    sys.exit(0 if solved else 1)
@@ -0,0 +1,35 @@
+import argparse
+import time
+import tracemalloc
+from generate import generate
+from solver import load_rules, solve, SEARCH_TIME_LIMIT
+
+def stress(n, count, time_limit):
+    '''
+    Solve `count` synthetic boards of side `n`, once for the time and once more under tracemalloc for the peak memory
+    '''
+    times, peaks, solved = [], [], 0
+    for seed in range(count):
+        _, texts = generate(n, seed)
+        rules = load_rules(texts)
+        t = time.perf_counter()
+        _, correct = solve(rules, n, time_limit)
+        times.append(time.perf_counter()-t)
+        tracemalloc.start()
+        solve(rules, n, time_limit)
+        peaks.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+        solved += correct
+    return solved, sorted(times), max(peaks)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog='stress', description='See how the solver scales on synthetic boards')
+    parser.add_argument('-n', '--sides', default='32,48,64,128', help='Comma-separated sizes to try')
+    parser.add_argument('-k', '--count', default=3, help='Number of boards per size')
+    parser.add_argument('-t', '--time-limit', default=SEARCH_TIME_LIMIT, help='Time budget in seconds for the backtracking fallback')
+    args = parser.parse_args()
+
+    print(f"{'side':>4} {'cells':>6} {'solved':>7} {'p50 (s)':>8} {'max (s)':>8} {'peak (MB)':>10}", flush=True)
+    for n in map(int, args.sides.split(',')):
+        solved, times, peak = stress(n, int(args.count), float(args.time_limit))
+        print(f'{n:>4} {3*n*n-3*n+1:>6} {solved:>3}/{len(times):<3} {times[len(times)//2]:>8.3f} {times[-1]:>8.3f} {peak/2**20:>10.1f}', flush=True)
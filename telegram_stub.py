@@ -0,0 +1,45 @@
+import argparse
+import json
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+class TelegramStubHandler(BaseHTTPRequestHandler):
+    '''
+    Answers sendMessage like the Bot API does and prints what it got,
+    rate limiting the first `rate_limit` messages of every chat with a 429
+    '''
+    rate_limit = 0
+    retry_after = 1
+    seen = Counter()
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        if not url.path.endswith('/sendMessage') or 'chat_id' not in query:
+            return self.reply(404, {'ok': False, 'error_code': 404, 'description': 'Not Found'})
+        self.seen[query['chat_id']] += 1
+        if self.seen[query['chat_id']] <= self.rate_limit:
+            return self.reply(429, {'ok': False, 'error_code': 429, 'description': f'Too Many Requests: retry after {self.retry_after}',
+                'parameters': {'retry_after': self.retry_after}})
+        print(f"{query['chat_id']}: {query.get('text')}", flush=True)
+        self.reply(200, {'ok': True, 'result': {'chat': {'id': query['chat_id']}, 'text': query.get('text')}})
+
+    def reply(self, status, body):
+        body = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog='telegram_stub', description='Local stand-in for the Telegram Bot API')
+    parser.add_argument('-p', '--port', default=8081, help='Port to listen on')
+    parser.add_argument('-r', '--rate-limit', default=0, help='Number of 429s to answer per chat before accepting messages')
+    args = parser.parse_args()
+
+    TelegramStubHandler.rate_limit = int(args.rate_limit)
+    server = ThreadingHTTPServer(('127.0.0.1', int(args.port)), TelegramStubHandler)
+    print(f'Bot API stub on http://127.0.0.1:{args.port}, run with TELEGRAM_API set to it', flush=True)
+    server.serve_forever()